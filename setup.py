@@ -12,7 +12,7 @@ with open("README.md", "r") as fh:
 
 VERSION = "0.1.0"
 
-install_requires = ["boto3", "paramiko", "scp", "nanoid"]
+install_requires = ["boto3", "paramiko", "nanoid"]
 
 extras = {}
 
@@ -27,7 +27,7 @@ setup(
     version=VERSION,
     author="Philipp Schmid",
     author_email="schmidphilipp1995@gmail.com",
-    description="A CLI/SDK to run remote scripts on ec2 via ssh/scp",
+    description="A CLI/SDK to run remote scripts on ec2 via ssh/sftp",
     url="https://github.com/philschmid/deep-learning-remote-runner",
     package_dir={"": "src"},
     packages=find_packages(where="src"),
@@ -1,13 +1,27 @@
+import atexit
+import codecs
 import io
+import json
 import logging
+import os
+import posixpath
+import random
+import select
+import shutil
+import socket
 import sys
+import tarfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Optional, Union
+from typing import Any, Callable, Optional, Tuple, Union
 
 import paramiko
 from boto3.session import Session
-from scp import SCPClient
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
 from nanoid import generate
 
@@ -19,7 +33,105 @@ logging.basicConfig(format="%(asctime)s | %(levelname)s | %(message)s", level=lo
 
 # TODO: keyboar InterruptedError
 
+# number of sftp channels used in parallel to upload files
+UPLOAD_WORKERS = 8
+# buffer size used when streaming uploads
+UPLOAD_BUFFER_SIZE = 1024 * 1024
+# max bytes read from a channel at once when streaming command output
+READ_SIZE = 256 * 1024
+# poll ec2 state every 5s instead of the boto3 default of 15s, keeping its 10 minute budget
+WAITER_CONFIG = {"Delay": 5, "MaxAttempts": 120}
+# attempts and max delay in seconds for connecting to a freshly started instance
+SSH_CONNECT_ATTEMPTS = 20
+SSH_MAX_RETRY_DELAY = 10
+SSH_USERNAME = "ubuntu"
+# receive window and max packet size the client advertises for its channels
+SSH_WINDOW_SIZE = 2**27
+SSH_MAX_PACKET_SIZE = 2**19
+# shared boto3 sessions, ec2 and pricing clients keyed by credentials, region and profile
+_session_cache = {}
+_session_cache_lock = threading.Lock()
+# authenticated ssh connections keyed by (host, user), commands and uploads open channels on them.
+# `_ssh_pool_lock` only guards the dicts, connecting is serialized per host by the lock in `_ssh_pool_host_locks`
+_ssh_pool = {}
+_ssh_pool_host_locks = {}
+_ssh_pool_lock = threading.Lock()
+# amis with a pre-pulled container created by `EC2RemoteRunner.make_ami`
+BAKED_AMI_FILE = Path.home() / ".cache" / "rm-runner" / "amis.json"
 
+
+def get_output_writer(stream: Any) -> Callable[[bytes], Any]:
+    """Returns a function writing raw bytes to `stream`, decoding incrementally if it only accepts text."""
+    if hasattr(stream, "buffer"):
+        return stream.buffer.write
+    # incremental decoder keeps multi-byte characters split across reads intact
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    return lambda data: stream.write(decoder.decode(data))
+
+
+def get_session_and_clients(
+    access_key_id: Optional[str] = None,
+    secret_access_key: Optional[str] = None,
+    session_token: Optional[str] = None,
+    region: Optional[str] = None,
+    profile: Optional[str] = None,
+) -> Tuple[Session, Any, Any]:
+    """
+    Returns a cached boto3 session with its ec2 and pricing clients, so runners share http connections and parsed
+    models. The session itself is not thread-safe, create clients only here under the lock.
+    """
+    cache_key = (access_key_id, secret_access_key, session_token, region, profile)
+    with _session_cache_lock:
+        if cache_key not in _session_cache:
+            session = Session(
+                aws_access_key_id=access_key_id,
+                aws_secret_access_key=secret_access_key,
+                aws_session_token=session_token,
+                region_name=region,
+                profile_name=profile,
+            )
+            config = Config(max_pool_connections=50, retries={"mode": "adaptive", "max_attempts": 10})
+            ec2_client = session.client("ec2", config=config)
+            # the pricing api is only available in us-east-1
+            pricing_client = session.client("pricing", region_name="us-east-1", config=config)
+            _session_cache[cache_key] = (session, ec2_client, pricing_client)
+        return _session_cache[cache_key]
+
+
+def _baked_ami_key(region: str, instance_type: str, container: str) -> str:
+    return f"{region}/{instance_type}/{container}"
+
+
+def get_baked_ami_id(region: str, instance_type: str, container: str) -> Optional[str]:
+    if not BAKED_AMI_FILE.exists():
+        return None
+    baked_amis = json.loads(BAKED_AMI_FILE.read_text())
+    return baked_amis.get(_baked_ami_key(region, instance_type, container))
+
+
+def save_baked_ami_id(region: str, instance_type: str, container: str, ami_id: Optional[str]) -> None:
+    """Stores `ami_id` for the region, instance type and container, `None` removes the entry."""
+    baked_amis = json.loads(BAKED_AMI_FILE.read_text()) if BAKED_AMI_FILE.exists() else {}
+    key = _baked_ami_key(region, instance_type, container)
+    if ami_id is None:
+        baked_amis.pop(key, None)
+    else:
+        baked_amis[key] = ami_id
+    BAKED_AMI_FILE.parent.mkdir(parents=True, exist_ok=True)
+    BAKED_AMI_FILE.write_text(json.dumps(baked_amis, indent=2))
+
+
+def is_ami_available(ami_id: str, ec2_client: Any) -> bool:
+    try:
+        images = ec2_client.describe_images(ImageIds=[ami_id])["Images"]
+    except ClientError as e:
+        if "InvalidAMIID" in e.response["Error"]["Code"]:
+            return False
+        raise e
+    return bool(images) and images[0]["State"] == "available"
+
+
+@lru_cache(maxsize=None)
 def get_ami_id_for_region_and_instance_type(instance_type: str, ec2_client: Any) -> str:
     if "dl1" in instance_type:
         name = "Deep Learning AMI Habana"
@@ -47,7 +159,7 @@ class EC2RemoteRunner:
 
     def __init__(
         self,
-        run_name: Optional[str] = f"rm-runner-{generate('abcdefghijklm', 4)}",
+        run_name: Optional[str] = None,
         instance_type: str = "t3.micro",
         container: str = "huggingface/optimum-habana:latest",
         access_key_id: Optional[str] = None,
@@ -56,125 +168,429 @@ class EC2RemoteRunner:
         region: Optional[str] = None,
         profile: Optional[str] = None,
     ) -> None:
-        self.session = Session(
-            aws_access_key_id=access_key_id,
-            aws_secret_access_key=secret_access_key,
-            aws_session_token=session_token,
-            region_name=region,
-            profile_name=profile,
+        self.session, self.ec2_client, self.pricing_client = get_session_and_clients(
+            access_key_id=access_key_id,
+            secret_access_key=secret_access_key,
+            session_token=session_token,
+            region=region,
+            profile=profile,
         )
         self.region = region
-        self.ec2_client = self.session.client("ec2")
-        self.ec2_resource = self.session.resource("ec2")
-        self.run_name = run_name
+        self.run_name = run_name or f"rm-runner-{generate('abcdefghijklmnopqrstuvwxyz0123456789', 8)}"
         self.instance_type = instance_type
         self.container = container
-        self.ami_id = get_ami_id_for_region_and_instance_type(instance_type, self.ec2_client)
+        self.ami_id = None
         self.runtime_args = self._get_runtime_args_from_instance_type(instance_type)
+        self.instance_id = None
+        self._instance_dns = None
+        self._container_pulled = False
+        self._stop_thread = None
+        self._stop_error = None
+        self._idle_timer = None
+        self._idle_lock = threading.Lock()
 
     def _start(self) -> None:
-        key = self._create_ec2_key_pair()
-        sg_id = self._create_ec2_security_group_with_ssh_ingress()
+        # look up the ami before creating anything, so a failing lookup leaves no resources behind
+        self.ami_id = self._get_ami_id()
+        # key pair and security group are independent api calls
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            key_future = executor.submit(self._create_ec2_key_pair)
+            sg_future = executor.submit(self._create_ec2_security_group_with_ssh_ingress)
+        error = key_future.exception() or sg_future.exception()
+        if error is not None:
+            # delete whichever of the two was created before raising
+            if key_future.exception() is None:
+                self.ec2_client.delete_key_pair(KeyName=self.run_name)
+            if sg_future.exception() is None:
+                self.ec2_client.delete_security_group(GroupId=sg_future.result())
+            raise error
+        key, sg_id = key_future.result(), sg_future.result()
         instance_id = self._run_ec2_instance(
-            ami_id=self.ami_id, instance_type=self.instance_type, key_name=self.run_name, sg_id=sg_id
+            ami_id=self.ami_id,
+            instance_type=self.instance_type,
+            key_name=self.run_name,
+            sg_id=sg_id,
+            # start pulling the container while the instance boots
+            user_data=f"#!/bin/bash\ndocker pull {self.container}\n",
         )
-        self.instance = self.ec2_resource.Instance(id=instance_id)
+        self.instance_id = instance_id
         logger.info(f"Waiting for instance to be ready...")
-        self.instance.wait_until_running()
-        public_dns = self.instance.public_dns_name
+        self.ec2_client.get_waiter("instance_running").wait(InstanceIds=[instance_id], WaiterConfig=WAITER_CONFIG)
+        public_dns = self.ec2_client.describe_instances(InstanceIds=[instance_id])["Reservations"][0]["Instances"][0][
+            "PublicDnsName"
+        ]
         logger.info(f"Instance is ready. Public DNS: {public_dns}")
-        self.ssh_client = self._setup_ssh_connection(key=key, instance_dns=public_dns)
+        self._ssh_key = key
+        self._instance_dns = public_dns
+        self._get_ssh_client()
         logger.info(f"Pulling container: {self.container}...")
         # TODO: check why it is not loaded with lower tier instance
-        stdin, stdout, stderr = self.ssh_client.exec_command(
-            f"docker pull {self.container}",
+        # skipped if the boot time pull already finished, otherwise joins the in progress download
+        stdin, stdout, stderr = self._get_ssh_client().exec_command(
+            f"docker image inspect {self.container} > /dev/null 2>&1 || docker pull {self.container}",
         )
         logger.debug(stdout.read().decode())
+        # `docker run` pulls again on its own, only `make_ami` depends on the image being present
+        self._container_pulled = stdout.channel.recv_exit_status() == 0
+        if not self._container_pulled:
+            logger.warning(f"Pulling container {self.container} failed: {stderr.read().decode()}")
+
+    def _get_ami_id(self) -> str:
+        # prefer an ami which already contains the container image
+        region = self.ec2_client.meta.region_name
+        baked_ami_id = get_baked_ami_id(region, self.instance_type, self.container)
+        if baked_ami_id:
+            if is_ami_available(baked_ami_id, self.ec2_client):
+                logger.info(f"Using ami with pre-pulled container: {baked_ami_id}")
+                return baked_ami_id
+            logger.info(f"Ami with pre-pulled container {baked_ami_id} is not available anymore, removing it")
+            save_baked_ami_id(region, self.instance_type, self.container, None)
+        return get_ami_id_for_region_and_instance_type(self.instance_type, self.ec2_client)
+
+    def make_ami(self) -> str:
+        """
+        Creates an ami with the container already pulled, following launches with the same region, instance type and
+        container use it and skip the image download.
+        """
+        self._start()
+        try:
+            if not self._container_pulled:
+                raise RuntimeError(f"Container {self.container} is not available on the instance, no ami created")
+            logger.info(f"Creating ami from instance: {self.instance_id}")
+            ami_id = self.ec2_client.create_image(
+                InstanceId=self.instance_id,
+                Name=self.run_name,
+                Description=f"rm-runner {self.instance_type} with {self.container}",
+            )["ImageId"]
+            self.ec2_client.get_waiter("image_available").wait(
+                ImageIds=[ami_id], WaiterConfig={"Delay": 15, "MaxAttempts": 120}
+            )
+            save_baked_ami_id(self.ec2_client.meta.region_name, self.instance_type, self.container, ami_id)
+            logger.info(f"Created ami: {ami_id}")
+        finally:
+            self._stop()
+        return ami_id
 
     def _exec_command(
-        self, command: Optional[str], source_dir: Union[Path, str] = None, runtime_args: Optional[str] = None
+        self,
+        command: Optional[str],
+        source_dir: Union[Path, str] = None,
+        runtime_args: Optional[str] = None,
+        tty: bool = False,
     ) -> str:
         # read script and move to remote
         exec_source_dir = source_dir if source_dir else "/home/ubuntu"
         runtime_args = runtime_args if runtime_args else self.runtime_args
 
         full_command = " ".join(
-            [
+            arg
+            for arg in [
                 "docker run",
+                # allocate the tty inside the container, only for commands which need one. Without a tty python
+                # would block-buffer stdout, so output is no longer streamed
+                "-t" if tty else "-e PYTHONUNBUFFERED=1",
                 runtime_args,
                 "--cap-add=sys_nice --net=host --ipc=host",
                 f"-v {exec_source_dir}:/home/ubuntu/rm-runner --workdir=/home/ubuntu/rm-runner",
                 f"{self.container}",
                 f"{command}",
             ]
+            if arg
         )
         logger.info(f"Executing: {full_command}")
 
-        stdin, stdout, stderr = self.ssh_client.exec_command(
-            full_command,
-            get_pty=True,
-        )
-        while True:
-            out = stdout.channel.recv(1024)
-            if not out:
-                break
-            sys.stdout.write(out.decode())
+        # new channel on the pooled connection, no additional handshake or authentication
+        channel = self._get_ssh_client().get_transport().open_session()
+        try:
+            channel.exec_command(full_command)
+            write_stdout, write_stderr = get_output_writer(sys.stdout), get_output_writer(sys.stderr)
+            while not channel.exit_status_ready():
+                select.select([channel], [], [], 1.0)
+                self._forward_channel_output(channel, write_stdout, write_stderr)
+            # drain output still buffered after the command exited
+            while channel.recv_ready() or channel.recv_stderr_ready():
+                self._forward_channel_output(channel, write_stdout, write_stderr)
             sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            channel.close()
 
-    def _upload_data(self, source_dir: Union[Path, str]) -> None:
+    @staticmethod
+    def _forward_channel_output(
+        channel: paramiko.Channel, write_stdout: Callable[[bytes], Any], write_stderr: Callable[[bytes], Any]
+    ) -> None:
+        if channel.recv_ready():
+            write_stdout(channel.recv(READ_SIZE))
+            # only flush once no more output is pending
+            if not channel.recv_ready():
+                sys.stdout.flush()
+        if channel.recv_stderr_ready():
+            write_stderr(channel.recv_stderr(READ_SIZE))
+            if not channel.recv_stderr_ready():
+                sys.stderr.flush()
+
+    def _upload_data(self, source_dir: Union[Path, str]) -> str:
         if isinstance(source_dir, str):
             source_dir = Path(source_dir)
         remote_path = "/home/ubuntu/test"
         logger.info(f"Uploading from {source_dir}")
-        with SCPClient(self.ssh_client.get_transport()) as scp:
-            scp.put(source_dir.absolute(), recursive=True, remote_path=remote_path)
+        if self._remote_command_exists("tar"):
+            self._upload_data_tar(source_dir, remote_path)
+        else:
+            logger.info("tar not available on remote, falling back to sftp")
+            self._upload_data_sftp(source_dir, remote_path)
         return remote_path
 
+    def _remote_command_exists(self, name: str) -> bool:
+        return self._get_remote_exit_status(f"command -v {name}") == 0
+
+    def _get_remote_exit_status(self, command: str) -> int:
+        channel = self._get_ssh_client().get_transport().open_session()
+        try:
+            channel.exec_command(command)
+            return channel.recv_exit_status()
+        finally:
+            channel.close()
+
+    def _upload_data_tar(self, source_dir: Path, remote_path: str) -> None:
+        # stream the directory as one tar archive through a single channel instead of per file transfers,
+        # nothing is written to local disk. The archive is not gzipped since the ssh transport already compresses
+        channel = self._get_ssh_client().get_transport().open_session()
+        try:
+            # start from an empty dir, a reused instance still has the files of the previous upload
+            channel.exec_command(f"rm -rf {remote_path} && mkdir -p {remote_path} && tar -xf - -C {remote_path}")
+            # unbuffered, tarfile already hands over 1 MiB blocks which are sent with `sendall`
+            with channel.makefile("wb", 0) as stream:
+                with tarfile.open(fileobj=stream, mode="w|", bufsize=UPLOAD_BUFFER_SIZE) as tar:
+                    tar.add(str(source_dir), arcname=".")
+            channel.shutdown_write()
+            exit_status = channel.recv_exit_status()
+            if exit_status != 0:
+                error = channel.makefile_stderr("rb").read().decode()
+                raise RuntimeError(f"Extracting upload on remote failed with exit code {exit_status}: {error}")
+        finally:
+            channel.close()
+
+    def _upload_data_sftp(self, source_dir: Path, remote_path: str) -> None:
+        # start from an empty dir, a reused instance still has the files of the previous upload
+        if self._get_remote_exit_status(f"rm -rf {remote_path}") != 0:
+            raise RuntimeError(f"Removing previous upload {remote_path} on remote failed")
+        sftp = self._get_ssh_client().open_sftp()
+        files = []
+        try:
+            self._sftp_makedir(sftp, remote_path)
+            for root, dirs, filenames in os.walk(source_dir):
+                remote_root = posixpath.normpath(
+                    posixpath.join(remote_path, Path(root).relative_to(source_dir).as_posix())
+                )
+                for dirname in dirs:
+                    self._sftp_makedir(sftp, posixpath.join(remote_root, dirname))
+                files.extend((os.path.join(root, f), posixpath.join(remote_root, f)) for f in filenames)
+        finally:
+            sftp.close()
+        # spread files over multiple sftp channels multiplexed on the same transport
+        workers = max(1, min(UPLOAD_WORKERS, len(files)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(self._sftp_put_files, files[i::workers]) for i in range(workers)]:
+                future.result()
+
+    def _sftp_put_files(self, files: list) -> None:
+        sftp = self._get_ssh_client().open_sftp()
+        try:
+            for local_path, remote_path in files:
+                with open(local_path, "rb") as local_file, sftp.open(remote_path, "wb") as remote_file:
+                    # pipelined writes are sent without waiting for each ack
+                    remote_file.set_pipelined(True)
+                    shutil.copyfileobj(local_file, remote_file, UPLOAD_BUFFER_SIZE)
+        finally:
+            sftp.close()
+
+    @staticmethod
+    def _sftp_makedir(sftp: paramiko.SFTPClient, path: str) -> None:
+        try:
+            sftp.stat(path)
+        except IOError:
+            sftp.mkdir(path)
+
+    def _get_ssh_client(self) -> paramiko.SSHClient:
+        pool_key = (self._instance_dns, SSH_USERNAME)
+        with _ssh_pool_lock:
+            host_lock = _ssh_pool_host_locks.setdefault(pool_key, threading.Lock())
+        # connecting can retry for minutes while the instance boots, only block users of the same host
+        with host_lock:
+            with _ssh_pool_lock:
+                ssh_client = _ssh_pool.get(pool_key)
+            transport = ssh_client.get_transport() if ssh_client is not None else None
+            if transport is None or not transport.is_active():
+                if ssh_client is not None:
+                    logger.info("SSH connection lost, reconnecting...")
+                    ssh_client.close()
+                ssh_client = self._setup_ssh_connection(key=self._ssh_key, instance_dns=self._instance_dns)
+                ssh_client.get_transport().set_keepalive(30)
+                with _ssh_pool_lock:
+                    _ssh_pool[pool_key] = ssh_client
+        return ssh_client
+
+    def _close_ssh_connection(self) -> None:
+        pool_key = (self._instance_dns, SSH_USERNAME)
+        with _ssh_pool_lock:
+            ssh_client = _ssh_pool.pop(pool_key, None)
+            _ssh_pool_host_locks.pop(pool_key, None)
+        if ssh_client is not None:
+            ssh_client.close()
+
     def _stop(self) -> None:
-        # termiante ec2 instances
-        logger.info(f"Terminating instance: {self.instance.id}")
-        self.instance.terminate()
-        # wait for ec2 instances to be terminated
-        self.instance.wait_until_terminated()
-        # delete sg
-        logger.info(f"Deleting security group: {self.run_name}")
-        self.ec2_client.delete_security_group(GroupName=self.run_name)
-        # delete key
-        logger.info(f"Deleting key: {self.run_name}")
-        self.ec2_client.delete_key_pair(KeyName=self.run_name)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # termiante ec2 instances
+            logger.info(f"Terminating instance: {self.instance_id}")
+            terminate = executor.submit(self.ec2_client.terminate_instances, InstanceIds=[self.instance_id])
+            # delete key, does not depend on the instance state
+            logger.info(f"Deleting key: {self.run_name}")
+            delete_key = executor.submit(self.ec2_client.delete_key_pair, KeyName=self.run_name)
+            # close ssh while the api calls are in flight
+            self._close_ssh_connection()
+            terminate.result()
+            # wait for ec2 instances to be terminated, the sg can only be deleted afterwards
+            self.ec2_client.get_waiter("instance_terminated").wait(
+                InstanceIds=[self.instance_id], WaiterConfig=WAITER_CONFIG
+            )
+            # delete sg
+            logger.info(f"Deleting security group: {self.run_name}")
+            self.ec2_client.delete_security_group(GroupName=self.run_name)
+            delete_key.result()
+
+    def _stop_in_background(self) -> None:
+        # non daemon thread, so the interpreter waits for the cleanup before exiting
+        self._stop_thread = threading.Thread(target=self._stop_and_record_error, name=f"{self.run_name}-stop")
+        self._stop_thread.start()
+
+    def _stop_when_idle(self, keep_alive: float) -> None:
+        # daemon timer, so an idle instance doesn't keep the interpreter alive. It is torn down at exit instead
+        self._idle_timer = threading.Timer(keep_alive, self._stop_idle)
+        self._idle_timer.name = f"{self.run_name}-stop"
+        self._idle_timer.daemon = True
+        self._stop_thread = self._idle_timer
+        # registered once per runner, even if an earlier timer already fired
+        atexit.unregister(self._stop_idle_at_exit)
+        atexit.register(self._stop_idle_at_exit)
+        self._idle_timer.start()
+
+    def _claim_idle_timer(self) -> Optional[threading.Timer]:
+        with self._idle_lock:
+            timer, self._idle_timer = self._idle_timer, None
+        if timer is not None:
+            timer.cancel()
+        return timer
+
+    def _stop_idle_at_exit(self) -> None:
+        if self._claim_idle_timer() is not None:
+            self._stop()
+        elif self._stop_thread is not None:
+            # the timer already fired, finish its teardown before the daemon thread is killed
+            self._stop_thread.join()
+
+    def _stop_idle(self) -> None:
+        with self._idle_lock:
+            if self._idle_timer is not threading.current_thread():
+                # instance was picked up by another launch
+                return
+            self._idle_timer = None
+        self._stop_and_record_error()
+
+    def _stop_and_record_error(self) -> None:
+        # errors of a background teardown are raised again by `wait_for_cleanup`
+        try:
+            self._stop()
+        except Exception as e:
+            logger.error(f"Cleanup failed: {e}")
+            self._stop_error = e
+
+    def _reuse_idle_instance(self) -> bool:
+        if self._claim_idle_timer() is None:
+            return False
+        atexit.unregister(self._stop_idle_at_exit)
+        # check the pooled connection directly, reconnecting would retry for minutes on a dead instance
+        with _ssh_pool_lock:
+            ssh_client = _ssh_pool.get((self._instance_dns, SSH_USERNAME))
+        transport = ssh_client.get_transport() if ssh_client is not None else None
+        try:
+            if transport is None or not transport.is_active():
+                raise paramiko.SSHException("connection is closed")
+            transport.send_ignore()
+        except (paramiko.SSHException, OSError) as e:
+            logger.info(f"Instance {self.instance_id} is not reachable ({e}), starting a new one")
+            self._stop_in_background()
+            return False
+        logger.info(f"Reusing instance: {self.instance_id}")
+        return True
+
+    def wait_for_cleanup(self, timeout: Optional[float] = None) -> None:
+        """
+        Blocks until the instance is terminated and its security group and key pair are deleted. Raises the error of
+        the teardown if it failed.
+        """
+        if self._stop_thread is not None:
+            self._stop_thread.join(timeout)
+        if self._stop_error is not None:
+            error, self._stop_error = self._stop_error, None
+            raise error
 
     def launch(
-        self, command: Optional[str], source_dir: Union[Path, str] = None, runtime_args: Optional[str] = None
+        self,
+        command: Optional[str],
+        source_dir: Union[Path, str] = None,
+        runtime_args: Optional[str] = None,
+        wait_for_termination: bool = False,
+        tty: bool = False,
+        keep_alive: float = 0,
     ) -> None:
         start_time = time.time()
-        # create ec2
-        self._start()
+        # create ec2, unless an instance kept alive by a previous launch is still running
+        if not self._reuse_idle_instance():
+            # a pending teardown deletes the key pair and security group with the same name
+            self.wait_for_cleanup()
+            self._start()
         startup_time = round(time.time() - start_time)
         # launch
         try:
             if source_dir:
                 source_dir = self._upload_data(source_dir)
-            self._exec_command(source_dir=source_dir, command=command, runtime_args=runtime_args)
+            self._exec_command(source_dir=source_dir, command=command, runtime_args=runtime_args, tty=tty)
             exec_time = round(time.time() - startup_time - start_time)
         except Exception as e:
             logger.error(e)
-            self._stop()
+            # always clean up, but don't delay surfacing the error on the terminate wait
+            self._stop_in_background()
             raise e
 
         # stop
-        self._stop()
-        terminate_time = round(time.time() - exec_time - startup_time - start_time)
+        if keep_alive > 0:
+            # keep the instance for following launches, it is terminated after `keep_alive` idle seconds
+            self._stop_when_idle(keep_alive)
+            terminate_time = None
+        elif wait_for_termination:
+            self._stop()
+            terminate_time = round(time.time() - exec_time - startup_time - start_time)
+        else:
+            # teardown runs in the background, use `wait_for_cleanup` to block on it
+            self._stop_in_background()
+            terminate_time = None
         total_time = round(time.time() - start_time)
         estimated_cost = get_price_for_instance_with_seconds(
-            duration=total_time - terminate_time,
+            duration=total_time - (terminate_time or 0),
             region=self.region,
             instance_type=self.instance_type,
-            session=self.session,
+            pricing_client=self.pricing_client,
         )
         logger.info(f"Total time:       {total_time}s")
         logger.info(f"Startup time:     {startup_time}s")
         logger.info(f"Execution time:   {exec_time}s")
-        logger.info(f"Termination time: {terminate_time}s")
+        if terminate_time is not None:
+            logger.info(f"Termination time: {terminate_time}s")
+        elif keep_alive > 0:
+            logger.info(f"Termination time: kept alive for {keep_alive}s")
+        else:
+            logger.info("Termination time: running in background")
         logger.info(f"Estimated cost:  ${estimated_cost}")
         return {
             "total_time": total_time,
@@ -197,27 +613,40 @@ class EC2RemoteRunner:
         return key
 
     def _create_ec2_security_group_with_ssh_ingress(self) -> str:
+        sg_kwargs = {
+            "GroupName": self.run_name,
+            "Description": "rm-runner only allow SSH traffic",
+        }
         try:
-            sg_id = self.ec2_client.create_security_group(
-                GroupName=self.run_name, Description="rm-runner only allow SSH traffic"
-            )["GroupId"]
+            sg_id = self.ec2_client.create_security_group(**sg_kwargs)["GroupId"]
         except Exception as e:
             if "Duplicate" in str(e):
                 self.ec2_client.delete_security_group(GroupName=self.run_name)
-                sg_id = self.ec2_client.create_security_group(
-                    GroupName=self.run_name, Description="rm-runner only allow SSH traffic"
-                )["GroupId"]
+                sg_id = self.ec2_client.create_security_group(**sg_kwargs)["GroupId"]
             else:
                 raise e
-        finally:
+        try:
             self.ec2_client.authorize_security_group_ingress(
-                GroupId=sg_id, IpProtocol="tcp", CidrIp="0.0.0.0/0", FromPort=22, ToPort=22
+                GroupId=sg_id,
+                IpPermissions=[
+                    {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+                ],
             )
+        except Exception as e:
+            # don't leave a half configured security group behind
+            self.ec2_client.delete_security_group(GroupId=sg_id)
+            raise e
         logger.info(f"Created security group: {self.run_name}")
         return sg_id
 
     def _run_ec2_instance(
-        self, ami_id="ami-06d20e48ee8d06029", instance_type="t3.micro", sg_id=None, key_name=None, volume_size=150
+        self,
+        ami_id="ami-06d20e48ee8d06029",
+        instance_type="t3.micro",
+        sg_id=None,
+        key_name=None,
+        volume_size=150,
+        user_data="",
     ):
         instance = self.ec2_client.run_instances(
             BlockDeviceMappings=[
@@ -232,6 +661,8 @@ class EC2RemoteRunner:
             MinCount=1,
             SecurityGroupIds=[sg_id],
             KeyName=key_name,
+            # boto3 takes care of the base64 encoding
+            UserData=user_data,
             # tag for name
         )
         logger.info(f"Launched instance: {instance['Instances'][0]['InstanceId']}")
@@ -253,16 +684,34 @@ class EC2RemoteRunner:
         key = paramiko.RSAKey.from_private_key(io.StringIO(key))
         ssh = paramiko.SSHClient()
         ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        t0 = 0
-        while t0 < 10:
+        for attempt in range(SSH_CONNECT_ATTEMPTS):
             try:
+                # cheap tcp probe so the ssh handshake is only attempted once sshd is listening
+                socket.create_connection((instance_dns, 22), timeout=2).close()
                 logger.info(f"Setting up ssh connection...")
-                ssh.connect(instance_dns, username="ubuntu", pkey=key)
-                break
-            except Exception:
-                t0 += 1
-                time.sleep(5)
-        return ssh
+                ssh.connect(
+                    instance_dns,
+                    username=SSH_USERNAME,
+                    pkey=key,
+                    allow_agent=False,
+                    look_for_keys=False,
+                    timeout=5,
+                    banner_timeout=10,
+                    auth_timeout=10,
+                    compress=True,
+                )
+                transport = ssh.get_transport()
+                # larger receive window and packets for channels opened from now on, instead of the 2 MiB/32 KiB
+                # defaults. This only speeds up data sent by the remote, e.g. command output; uploads are bound by
+                # the window sshd advertises
+                transport.default_window_size = SSH_WINDOW_SIZE
+                transport.default_max_packet_size = SSH_MAX_PACKET_SIZE
+                return ssh
+            except Exception as e:
+                if attempt == SSH_CONNECT_ATTEMPTS - 1:
+                    raise e
+                # exponential backoff with jitter
+                time.sleep(min(SSH_MAX_RETRY_DELAY, 0.5 * 2**attempt) + random.uniform(0, 0.25))
 
     def _get_runtime_args_from_instance_type(self, instance_type):
         if "dl1" in instance_type:
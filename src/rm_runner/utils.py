@@ -25,6 +25,7 @@ def get_ec2_instance_hourly_price(
     preinstalled_software="NA",
     tenancy="Shared",
     is_byol=False,
+    pricing_client=None,
 ):
 
     region_name = get_region_name(region_code)
@@ -50,7 +51,8 @@ def get_ec2_instance_hourly_price(
         {"Type": "TERM_MATCH", "Field": "licenseModel", "Value": license_model},
     ]
 
-    pricing_client = session.client("pricing", region_name="us-east-1")
+    if pricing_client is None:
+        pricing_client = session.client("pricing", region_name="us-east-1")
 
     response = pricing_client.get_products(ServiceCode="AmazonEC2", Filters=filters)
 
@@ -65,10 +67,13 @@ def get_ec2_instance_hourly_price(
     return None
 
 
-def get_price_for_instance_with_seconds(duration=None, region=None, instance_type=None, session=None):
+def get_price_for_instance_with_seconds(
+    duration=None, region=None, instance_type=None, session=None, pricing_client=None
+):
     hour_price = get_ec2_instance_hourly_price(
         region_code=region,
         session=session,
+        pricing_client=pricing_client,
         instance_type=instance_type,
         operating_system="Linux",
     )